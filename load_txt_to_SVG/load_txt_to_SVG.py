@@ -8,53 +8,124 @@ MD→SVG flowed text auto-fill for layers p1..pN
 - 本版は base_dir（UI引数）を優先。未指定時は自動探索で Downloads/Documents/Desktop なども見る。
 """
 from __future__ import annotations
-import re, json
+import re, json, unicodedata
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Tuple, Optional
 import inkex
 from inkex import NSS
 from lxml import etree
 from copy import deepcopy
-import subprocess, sys
+import os, subprocess, sys
+
+try:
+    # あれば orjson（Rust実装）でJSONを読む。無ければ標準ライブラリのまま
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 PX_PER_MM = 96.0 / 25.4
 FULLWIDTH_SPACE = "\u3000"
+
+# 正規表現は毎回 re.* に渡すと内部キャッシュ検索が入るため、モジュール読込時に一括コンパイル
+H2_RE = re.compile(r"^\s*(?:[#＃]{2}|[0-9０-９]+[\.．)])\s*")   # 1. / １． / ## / ＃＃
+LI_RE = re.compile(r"^\s*(?:[-*－＊・•])\s*(.*)$")      # - * 全角－＊ ・ •（後続空白は任意）
+BOLD_RE = re.compile(r"\*\*(.+?)\*\*")
+BR_RE = re.compile(r"(?m)\\\s*$")                               # 行末の単独「\」
+ID_SANITIZE_RE = re.compile(r"[^a-zA-Z0-9_.:-]")
+ID_SUFFIX_RE = re.compile(r"^(.*?)-(\d+)$")
 INK_LABEL = inkex.addNS('label', 'inkscape')
 INK_GROUPMODE = inkex.addNS('groupmode', 'inkscape')
 SODO_INSEN = inkex.addNS('insensitive', 'sodipodi')
-
+# 要素生成ループ内で毎回 addNS（辞書引き+文字列整形）を呼ばないための定数
+SVG_G = inkex.addNS('g', 'svg')
+SVG_TEXT = inkex.addNS('text', 'svg')
+SVG_FLOWROOT = inkex.addNS('flowRoot', 'svg')
+SVG_TSPAN = inkex.addNS('tspan', 'svg')
+SVG_FLOWPARA = inkex.addNS('flowPara', 'svg')
+SVG_FLOWSPAN = inkex.addNS('flowSpan', 'svg')
+INK_PAGE = inkex.addNS('page', 'inkscape')
+INK_DOC_UNITS = inkex.addNS('document-units', 'inkscape')
+INK_EXPORT_FILENAME = inkex.addNS('export-filename', 'inkscape')
+SODO_NAMEDVIEW = inkex.addNS('namedview', 'sodipodi')
+
+
+# コンパイル済みXPath（呼出し毎の式パースを回避。ラベルは $lab の変数束縛で渡す）
+_LAYER_BY_LABEL = etree.XPath(
+    ".//svg:g[@inkscape:groupmode='layer' and @inkscape:label=$lab]", namespaces=NSS)
 
 def _find_layer_by_label(root, label: str):
-    for g in root.iterfind('.//svg:g', namespaces=inkex.NSS):
-        if g.get(INK_GROUPMODE) == 'layer' and g.get(INK_LABEL) == label:
-            return g
-    return None
+    res = _LAYER_BY_LABEL(root, lab=label)
+    return res[0] if res else None
 
-def _find_layer_by_labels(root, labels):
+def _is_within(node, scope) -> bool:
+    """node が scope の子孫なら True（scope 自身は含めない）。"""
+    p = node.getparent()
+    while p is not None:
+        if p is scope:
+            return True
+        p = p.getparent()
+    return False
+
+def _lookup_layer(root, label: str, cache=None):
+    """cache（label→レイヤ辞書）があれば辞書引き。ミス時のみXPathで探して登録する。
+
+    cache は文書全体で共有の索引なので、root が部分木のときはヒットが
+    root 配下にあることを確かめてから採用する（別スコープの同名レイヤ対策）。"""
+    if cache is not None:
+        node = cache.get(label)
+        if node is not None and _is_within(node, root):
+            return node
+    node = _find_layer_by_label(root, label)
+    if cache is not None and node is not None:
+        cache[label] = node
+    return node
+
+def _find_layer_by_labels(root, labels, cache=None):
+    """候補ラベルを優先順で探す。候補ごとに全木を歩かず、走査は1回に抑える。"""
+    if cache is not None:
+        node = cache.get(labels[0])
+        # 最優先候補がキャッシュ済み（かつ root 配下）なら走査自体が不要
+        if node is not None and _is_within(node, root):
+            return node
+    wanted = set(labels)
+    found = {}
+    for g in root.iter(SVG_G):
+        lab = g.get(INK_LABEL)
+        if lab in wanted and lab not in found and g.get(INK_GROUPMODE) == 'layer':
+            found[lab] = g
+            if len(found) == len(wanted):
+                break
+    if cache is not None:
+        cache.update(found)
     for lb in labels:
-        node = _find_layer_by_label(root, lb)
+        node = found.get(lb)
         if node is not None:
             return node
     return None
 
-def _delete_layer_if_exists(root, label: str):
-    node = _find_layer_by_label(root, label)
+def _delete_layer_if_exists(root, label: str, cache=None):
+    node = _lookup_layer(root, label, cache)
     if node is not None and node.getparent() is not None:
         node.getparent().remove(node)
+    if cache is not None:
+        cache.pop(label, None)
 
-def _new_layer(root, label: str):
+def _new_layer(root, label: str, cache=None):
     g = inkex.Group()
     g.set(INK_GROUPMODE, 'layer')
     g.set(INK_LABEL, label)
     g.set('id', root.get_unique_id(label.replace('[','').replace(']','')))
     root.append(g)
+    if cache is not None:
+        cache[label] = g
     return g
 
 def _clone_children(dst_parent, src_parent):
     for child in list(src_parent):
         dst_parent.append(deepcopy(child))
 
-def ensure_page_horizontal(self, n: int, step_px: float = 220.0, logs=None):
+def ensure_page_horizontal(self, n: int, step_px: float = 220.0, logs=None, layers=None):
     """
     p3以降のページレイヤーを横方向へ整列して再作成。
     ・既存 p{n} があれば削除
@@ -69,8 +140,8 @@ def ensure_page_horizontal(self, n: int, step_px: float = 220.0, logs=None):
 
     # 既存p{n}削除→新規作成
     label = f"p{n}"
-    _delete_layer_if_exists(root, label)
-    page_layer = _new_layer(root, label)
+    _delete_layer_if_exists(root, label, cache=layers)
+    page_layer = _new_layer(root, label, cache=layers)
 
     # 位置を横方向へ
     x = (n - 1) * step_px
@@ -79,12 +150,12 @@ def ensure_page_horizontal(self, n: int, step_px: float = 220.0, logs=None):
         logs.append(f"[POS] page{n} x={(n-1)*step_px} dx_px={step_px}")
 
     # フォーマット取得（[フォーマット] または フォーマット）
-    fmt_root = _find_layer_by_labels(root, ['[フォーマット]', 'フォーマット'])
+    fmt_root = _find_layer_by_labels(root, ['[フォーマット]', 'フォーマット'], cache=layers)
     if fmt_root is None:
         raise inkex.AbortExtension('[ERR] レイヤー「[フォーマット]」が見つかりません')
 
     # f2取得
-    f2 = _find_layer_by_label(fmt_root, 'f2')
+    f2 = _lookup_layer(fmt_root, 'f2', cache=layers)
     if f2 is None:
         raise inkex.AbortExtension('[ERR] 「[フォーマット]」配下に「f2」が見つかりません')
 
@@ -100,25 +171,25 @@ def ensure_page_horizontal(self, n: int, step_px: float = 220.0, logs=None):
 
 
 
-def ensure_pages_horizontal_from_p3(self, total_pages: int, step_px: float = 220.0, logs=None):
+def ensure_pages_horizontal_from_p3(self, total_pages: int, step_px: float = 220.0, logs=None, layers=None):
     """
     必要ページ数 total_pages に対し、p3...pN を横並びで用意。
     """
     for n in range(3, max(3, total_pages + 1)):
-        ensure_page_horizontal(self, n, step_px=step_px, logs=logs)
+        ensure_page_horizontal(self, n, step_px=step_px, logs=logs, layers=layers)
 
 
 def _ensure_pages(docroot):
     nv = _namedview(docroot)
     if nv is None:
-        nv = etree.Element(inkex.addNS("namedview","sodipodi"))
+        nv = etree.Element(SODO_NAMEDVIEW)
         docroot.insert(0, nv)
     pgs = _list_pages(nv)
     if not pgs:
         # ルートの viewBox or width/height から1枚作る
         vb = (docroot.get("viewBox") or "0 0 210 297").split()
         w = float(docroot.get("width",  vb[2])); h = float(docroot.get("height", vb[3]))
-        pg = etree.Element(inkex.addNS("page","inkscape"))
+        pg = etree.Element(INK_PAGE)
         pg.set("x","0"); pg.set("y","0"); pg.set("width",str(w)); pg.set("height",str(h))
         pg.set("id","page1"); nv.append(pg)
 
@@ -136,115 +207,312 @@ def _list_pages(nv):
 
 
 def _doc_units(nv):
-    return nv.get(inkex.addNS("document-units","inkscape"), "px").lower()
+    return nv.get(INK_DOC_UNITS, "px").lower()
+
+def _append_pages_like(nv, last_page, count, gap_units=10.0, existing=None):
+    """last_page と同寸のページを count 枚まとめて追加する。
 
-def _append_page_like(nv, last_page, gap_units=10.0):
+    id は手元のカウンタ（existing 省略時のみ一度数える）で振り、
+    DOMへの挿入は extend 1回にまとめる。1枚ごとに xpath で数え直すと
+    ページ数に対して二乗で走査が増えるため。
+    """
     _, lx, ly, lw, lh = last_page
-    nx = lx + lw + gap_units
-    new_pg = etree.Element(inkex.addNS("page","inkscape"))
-    new_pg.set("x", str(nx)); new_pg.set("y", str(ly))
-    new_pg.set("width", str(lw)); new_pg.set("height", str(lh))
-    new_pg.set("id", f"page{len(nv.xpath('./inkscape:page', namespaces=NSS))+1}")
-    nv.append(new_pg)
-    return (new_pg, nx, ly, lw, lh)
+    base = len(_list_pages(nv)) if existing is None else existing
+    new_pages = []
+    elems = []
+    sly, slw, slh = str(ly), str(lw), str(lh)
+    for k in range(count):
+        nx = lx + (lw + gap_units) * (k + 1)
+        pg = etree.Element(INK_PAGE)
+        pg.set("x", str(nx)); pg.set("y", sly)
+        pg.set("width", slw); pg.set("height", slh)
+        pg.set("id", f"page{base + k + 1}")
+        elems.append(pg)
+        new_pages.append((pg, nx, ly, lw, lh))
+    nv.extend(elems)
+    return new_pages
 
 
 def _collect_ids(root):
+    """使用中idの集合と「基底名→次の空き連番」の表を一度の走査で作る。"""
     used = set()
+    next_suffix: Dict[str, int] = {}
     for el in root.iter():
         i = el.get("id")
         if i:
             used.add(i)
-    return used
-
-def _gen_unique_id(used, base: str):
-    base = re.sub(r"[^a-zA-Z0-9_.:-]", "_", base or "id")
-    cand = base
-    i = 1
+            m = ID_SUFFIX_RE.match(i)
+            if m:
+                base, n = m.group(1), int(m.group(2)) + 1
+                if n > next_suffix.get(base, 0):
+                    next_suffix[base] = n
+    return used, next_suffix
+
+def _gen_unique_id(used, next_suffix, base: str):
+    base = ID_SANITIZE_RE.sub("_", base or "id")
+    n = next_suffix.get(base, 0)
+    cand = base if n == 0 else f"{base}-{n}"
     while cand in used:
-        cand = f"{base}-{i}"
-        i += 1
+        n += 1
+        cand = f"{base}-{n}"
+    next_suffix[base] = n + 1
     used.add(cand)
     return cand
 
 
+@lru_cache(maxsize=0x10000)
+def _w(o: int) -> int:
+    """コードポイントの表示幅。East Asian Width の F/W を全角=2 とみなす。"""
+    return 2 if unicodedata.east_asian_width(chr(o)) in ("F", "W") else 1
+
+# BMP全域の文字幅表（1=半角, 2=全角）。ループ内の ord+範囲比較4回を表引き1回に置換。
+# 手書きレンジだとハングルJamoや全角記号(0xFFE7以降)等を取りこぼすため unicodedata から生成。
+_WIDTH = bytearray(b"\x01" * 0x10000)
+for _o in range(0x80, 0x10000):
+    if unicodedata.east_asian_width(chr(_o)) in ("F", "W"):
+        _WIDTH[_o] = 2
+del _o
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None          # numpy は任意依存。無ければスカラー経路のみ
+
+if _np is not None:
+    _WIDTH_NP = _np.frombuffer(bytes(_WIDTH), dtype=_np.uint8)
+# これ未満の段落は numpy の前準備（encode+配列化）が勝つのでスカラー経路を使う
+_NP_MIN_PARA = 1000
+
+try:
+    from numba import njit as _njit
+    _HAS_NUMBA = _np is not None
+except ImportError:
+    _HAS_NUMBA = False
+
+if _HAS_NUMBA:
+    @_njit(cache=True)
+    def _wrap_breaks_nb(codes, width, cols):
+        """折返し行の (開始, 終了) 添字列を返すJITカーネル。規則はスカラー経路と同一。"""
+        n = codes.shape[0]
+        starts = _np.empty(n + 1, _np.int64)
+        ends = _np.empty(n + 1, _np.int64)
+        m = 0; start = 0; wsum = 0
+        for i in range(n):
+            c = codes[i]
+            w = width[c]
+            if wsum + w > cols:
+                starts[m] = start; ends[m] = i; m += 1
+                wsum = 0
+                if c == 0x20:      # 折返し直後の空白は捨てる
+                    start = i + 1
+                    continue
+                start = i
+            wsum += w
+        starts[m] = start; ends[m] = n; m += 1
+        return starts[:m], ends[:m]
+
 def is_fullwidth(ch: str) -> bool:
+    # ASCII先行判定の分岐は置かず、常に表引き1回＋比較1回で済ませる
+    # （和文主体の入力では分岐はほぼ常に不成立側で、判定コストの方が高い）
     o = ord(ch)
-    return (0x3000 <= o <= 0x30FF) or (0x3400 <= o <= 0x9FFF) or (0xFF01 <= o <= 0xFF60) or (0xFFE0 <= o <= 0xFFE6)
+    return (_WIDTH[o] if o < 0x10000 else _w(o)) == 2
+
+def _wrap_para_np(para: str, codes, cols: int):
+    """長い段落用：幅の累積和に対する二分探索で折返し位置を求める。
+
+    スカラー経路と同じ規則（折返し直後の空白1つは捨てる、収まらない文字は
+    単独行にする）を保ったまま、文字毎のPythonループを numpy に置き換える。
+    """
+    cs = _WIDTH_NP[codes].cumsum()
+    searchsorted = _np.searchsorted
+    n = len(para)
+    pos = 0; base = 0; fresh = True   # fresh: 行頭に文字がまだ無い状態
+    while pos < n:
+        j = int(searchsorted(cs, base + cols, side="right"))
+        if j <= pos:                  # 先頭の1文字すら収まらない
+            if fresh:
+                yield ""
+            j = pos + 1
+        if j >= n:
+            yield para[pos:]
+            return
+        yield para[pos:j]
+        base = int(cs[j - 1])
+        if para[j] == " ":
+            base += 1                 # 読み飛ばす空白の幅
+            pos = j + 1
+            fresh = True
+        else:
+            pos = j
+            fresh = False
+    yield ""   # 末尾が空白読み飛ばしで終わった場合の空行（スカラー経路と同じ）
 
 def split_inline_bold(text: str) -> List[Tuple[str, bool]]:
+    if "**" not in text:   # 太字マーカー無し（大半の行）は正規表現を走らせない
+        return [(text, False)]
     parts: List[Tuple[str, bool]] = []
     i = 0
-    for m in re.finditer(r"\*\*(.+?)\*\*", text):
+    for m in BOLD_RE.finditer(text):
         if m.start() > i: parts.append((text[i:m.start()], False))
         parts.append((m.group(1), True)); i = m.end()
     if i < len(text): parts.append((text[i:], False))
     return parts or [("", False)]
 
-def apply_style(el, props):
-    if not props: return
-    cur = {}
-    for item in el.get("style","").split(";"):
+@lru_cache(maxsize=256)
+def _parse_style_cached(s: str) -> Tuple[Tuple[str, str], ...]:
+    # style文字列は同じものが繰り返し現れるため、分解結果をキャッシュする。
+    # 呼出し側で変更できるよう、辞書化はタプルから毎回行う（_parse_style参照）
+    items = []
+    for item in s.split(";"):
         if ":" in item:
-            k,v = item.split(":",1); cur[k.strip()] = v.strip()
-    cur.update(props)
+            k,v = item.split(":",1); items.append((k.strip(), v.strip()))
+    return tuple(items)
+
+def _parse_style(s: str) -> Dict[str, str]:
+    return dict(_parse_style_cached(s))
+
+# 太字扱いするfont-weight値（frozensetで毎回のタプル生成を省く）
+_BOLD_WEIGHTS = frozenset(("bold", "700", "800", "900"))
+
+# マージ結果→直列化済みstyle文字列のキャッシュ。同じ書式を数千行に適用するため、
+# 2行目以降は文字列構築を辞書引き1回に短縮できる
+_STYLE_CACHE: Dict[frozenset, str] = {}
+
+def _sync_font_spec(cur: Dict[str, str]) -> None:
     # font-family / font-weight → -inkscape-font-specification を同期
     fam = (cur.get("font-family") or "").strip().strip('"\'')
     wt  = (cur.get("font-weight") or "").lower()
     if fam or wt:
         spec = fam
-        if wt in ("bold","700","800","900"): spec = (spec + " Bold").strip()
+        if wt in _BOLD_WEIGHTS: spec = (spec + " Bold").strip()
         if spec: cur["-inkscape-font-specification"] = spec
-    el.set("style",";".join(f"{k}:{v}" for k,v in cur.items() if v is not None))
 
+def _serialize_style(cur: Dict[str, str], key: frozenset) -> str:
+    s = _STYLE_CACHE.get(key)
+    if s is None:
+        _sync_font_spec(cur)
+        s = ";".join(f"{k}:{v}" for k,v in cur.items() if v is not None)
+        _STYLE_CACHE[key] = s
+    return s
+
+def _style_str(props: Dict[str, str]) -> str:
+    """新規要素向け：既存styleとのマージを省き props をそのまま直列化（キャッシュ共用）。"""
+    return _serialize_style(dict(props), frozenset(props.items()))
+
+def apply_style(el, props):
+    if not props: return
+    old = el.get("style")
+    if not old:
+        # 既存styleが無ければマージ不要：props直列化だけで済む
+        el.set("style", _style_str(props))
+        return
+    cur = _parse_style(old)
+    cur.update(props)
+    el.set("style", _serialize_style(cur, frozenset(cur.items())))
+
+def apply_style_fresh(el, props):
+    """新規生成直後の要素向け：既存styleが無い前提でパース／マージを省く。"""
+    if props: el.set("style", _style_str(props))
+
+# 行中の太字tspan用。辞書を行ごとに作り直さない
+_BOLD_PROPS = {"font-weight": "bold"}
+
+
+def _tokenize_css(raw: str):
+    """CSSを一度の走査で (selector, {prop: val}) の列に分解する。
+
+    コメント除去→規則抽出→プロパティ抽出と正規表現で3〜4回なめていたのを、
+    str.find（C実装の部分文字列検索）による状態機械1回に置き換える。
+    """
+    pos, n = 0, len(raw)
+    buf: List[str] = []     # コメントを除いた現在区間のテキスト断片
+    selector = None         # None=セレクタ読取中 / str=本文読取中
+    while pos < n:
+        cm = raw.find("/*", pos)
+        delim = raw.find("}" if selector is not None else "{", pos)
+        if cm != -1 and (delim == -1 or cm < delim):
+            buf.append(raw[pos:cm])
+            end = raw.find("*/", cm + 2)
+            pos = n if end == -1 else end + 2
+            continue
+        if delim == -1:
+            break
+        buf.append(raw[pos:delim])
+        text = "".join(buf); buf = []
+        if selector is None:
+            selector = text.strip()
+        else:
+            props: Dict[str, str] = {}
+            for item in text.split(";"):
+                if ":" in item:
+                    k, v = item.split(":", 1)
+                    k = k.strip(); v = v.strip()
+                    if k and v:
+                        props[k] = v
+            yield selector, props
+            selector = None
+        pos = delim + 1
 
 def parse_css(css_path: Path) -> Tuple[Dict[str, Dict[str, str]], Dict[str, Dict[str, str]]]:
     semantic: Dict[str, Dict[str, str]] = {}
     by_label: Dict[str, Dict[str, str]] = {}
     if not css_path.exists(): return semantic, by_label
     raw = css_path.read_text(encoding="utf-8", errors="ignore")
-    raw = re.sub(r"/\*.*?\*/","", raw, flags=re.S)
-    sem_rule = re.compile(r"(##|p|li|h2)\s*\{([^}]*)\}", re.I)
-    prop_re = re.compile(r"([a-zA-Z0-9\-]+)\s*:\s*([^;]+);?")
-    for m in sem_rule.finditer(raw):
-        sel = m.group(1).lower()
-        if sel == "##": sel = "h2"
-        body = m.group(2)
-        semantic[sel] = {pm.group(1).strip(): pm.group(2).strip() for pm in prop_re.finditer(body)}
-    lab_rule = re.compile(r"\[\s*inkscape\\:label\s*=\s*\"([^\"]+)\"\s*\]\s*\{([^}]*)\}", re.I)
-    for m in lab_rule.finditer(raw):
-        lab = m.group(1).strip(); body = m.group(2)
-        by_label[lab] = {pm.group(1).strip(): pm.group(2).strip() for pm in prop_re.finditer(body)}
+    for sel, props in _tokenize_css(raw):
+        if sel.startswith("[") and "inkscape\\:label" in sel:
+            q1 = sel.find('"'); q2 = sel.find('"', q1 + 1)
+            if q1 != -1 and q2 != -1:
+                by_label[sel[q1+1:q2].strip()] = props
+            continue
+        key = sel.split()[-1].lower() if sel else ""
+        if key == "##": key = "h2"
+        if key in ("h2", "p", "li"):
+            semantic[key] = props
     return semantic, by_label
 
+_HAS_ID = etree.XPath("descendant-or-self::*[@id]")
+
+# 1件見つかれば十分な検索は、全一致を集めるXPathより最初のヒットで打ち切れる
+# 木の反復の方が速い（特にテキスト流し込み後の巨大なレイヤ配下）
 def find_layer_by_label(root: etree.Element, name: str) -> Optional[etree.Element]:
-    for g in root.iterfind(".//svg:g", namespaces=NSS):
-        if g.get(f"{{{NSS['inkscape']}}}groupmode")=="layer" and g.get(f"{{{NSS['inkscape']}}}label")==name:
+    for g in root.iter(SVG_G):
+        if g.get(INK_GROUPMODE)=="layer" and g.get(INK_LABEL)==name:
             return g
     return None
 
-# def find_text_by_label(scope: etree.Element, label: str) -> Optional[etree.Element]:
-#     res = scope.xpath(".//*[@inkscape:label=$lab and (self::svg:text or self::svg:flowRoot)]", namespaces=NSS, lab=label)
-#     return res[0] if res else None
+def _index_layers(root: etree.Element) -> Dict[str, etree.Element]:
+    """一度の走査で {label: レイヤ要素} を作る。繰り返しの全木検索を辞書引きに置換。"""
+    d: Dict[str, etree.Element] = {}
+    for g in root.iter(SVG_G):
+        if g.get(INK_GROUPMODE) == "layer":
+            lab = g.get(INK_LABEL)
+            if lab and lab not in d:
+                d[lab] = g
+    return d
+
 def find_text_by_label(scope, label: str):
-    # 変数渡しは不可。式に直書きする
-    xp = f".//*[@inkscape:label='{label}' and (self::svg:text or self::svg:flowRoot)]"
-    res = scope.xpath(xp, namespaces=NSS)
-    return res[0] if res else None
+    for el in scope.iter(SVG_TEXT, SVG_FLOWROOT):
+        if el.get(INK_LABEL) == label:
+            return el
+    return None
 
 
-def clone_layer_as(root, src_layer, new_name, text_label_old, text_label_new):
-    clone = etree.fromstring(etree.tostring(src_layer))
-    clone.set(f"{{{NSS['inkscape']}}}label", new_name)
+def clone_layer_as(root, src_layer, new_name, text_label_old, text_label_new, ids=None):
+    # tostring/fromstring の直列化往復ではなく、lxmlがC実装で持つdeepcopyで複製する
+    clone = deepcopy(src_layer)
+    clone.set(INK_LABEL, new_name)
     for el in clone.xpath(".//*[@inkscape:label]", namespaces=NSS):
-        if el.get(f"{{{NSS['inkscape']}}}label") == text_label_old:
-            el.set(f"{{{NSS['inkscape']}}}label", text_label_new)
+        if el.get(INK_LABEL) == text_label_old:
+            el.set(INK_LABEL, text_label_new)
             break
     # ↓ ここを置換（unique_id廃止）
-    used = _collect_ids(root)
-    for el in clone.iter():
-        if "id" in el.attrib:
-            el.attrib["id"] = _gen_unique_id(used, el.attrib["id"])
+    if ids is None:
+        ids = _collect_ids(root)
+    used, next_suffix = ids
+    # id を持つ要素だけC側で選別してから振り直す（全要素のattrib検査を回避）
+    for el in _HAS_ID(clone):
+        attrib = el.attrib
+        attrib["id"] = _gen_unique_id(used, next_suffix, attrib["id"])
     root.append(clone)
     return clone
 
@@ -252,14 +520,20 @@ def clone_layer_as(root, src_layer, new_name, text_label_old, text_label_new):
 def clear_text(el: etree.Element):
     local = el.tag.split('}')[-1]
     if local == "flowRoot":
-        for child in list(el):
-            c = child.tag.split('}')[-1]
-            if c in ("flowPara","flowDiv","flowSpan"):
-                el.remove(child)
+        # flowRegion等は残すので対象だけ集め、後ろから外す
+        # （先頭から remove すると lxml 内部の詰め直しで O(n²) になる）
+        to_remove = [child for child in el
+                     if child.tag.split('}')[-1] in ("flowPara","flowDiv","flowSpan")]
+        for child in reversed(to_remove):
+            el.remove(child)
         el.text = None
     else:
-        for child in list(el): el.remove(child)
-        el.text = None
+        # 子の個別 remove ではなく、属性と tail を保ったままC側で一括クリア
+        attrib = dict(el.attrib)
+        tail = el.tail
+        el.clear(keep_tail=True)
+        el.attrib.update(attrib)
+        el.tail = tail
 
 def reset_box_style(el, settings):
     # 親<Text>に残るフォント系を除去（子の指定を優先させる）
@@ -289,7 +563,7 @@ def reset_box_style(el, settings):
 
 def read_settings(path: Path) -> Dict:
     if path.exists():
-        try: return json.loads(path.read_text(encoding="utf-8"))
+        try: return _json_loads(path.read_bytes())
         except Exception: pass
     return {
         "lines_per_page": {"p1":21, "default":30},
@@ -297,49 +571,80 @@ def read_settings(path: Path) -> Dict:
         "style_defaults": {"fill":"#000000", "stroke":"#ffffff"}
     }
 
-def wrap_text_to_cols(text: str, cols: int) -> List[str]:
+def iter_wrap(text: str, cols: int):
+    """折返し済みの行を1本ずつ生成する。全行のリストを先に作らない。"""
     text = text.replace("<br>", "\n")
     text = text.replace("\\\\", "\n")                 # 2本
-    text = re.sub(r"(?m)\\\s*$", "\n", text)          # 1本（行末）
-    out: List[str] = []
+    text = BR_RE.sub("\n", text)                      # 1本（行末）
+    width = _WIDTH; wide = _w   # グローバル参照をループ外で束縛
     for para in text.split("\n"):
-        if para=="": out.append(""); continue
-        line=""; wsum=0
+        if para=="": yield ""; continue
+        if para.isascii():
+            # 純ASCII段落は全て幅1なので、文字毎の幅引きをやめて cols 文字ずつ切るだけ。
+            # 折返し位置の直後が空白なら1つ捨てる（下の通常経路と同じ規則）
+            while len(para) > cols:
+                yield para[:cols]
+                para = para[cols:]
+                if para.startswith(" "):
+                    para = para[1:]
+            yield para
+            continue
+        if _np is not None and len(para) >= _NP_MIN_PARA:
+            codes = _np.frombuffer(para.encode("utf-32-le"), dtype="<u4")
+            if int(codes.max()) < 0x10000:   # 非BMPが混ざる稀な段落はスカラー経路へ
+                if _HAS_NUMBA:
+                    starts, ends = _wrap_breaks_nb(codes, _WIDTH_NP, cols)
+                    for k in range(len(starts)):
+                        yield para[starts[k]:ends[k]]
+                else:
+                    yield from _wrap_para_np(para, codes, cols)
+                continue
+        buf=[]; wsum=0    # 文字列 += の再確保を避け、行確定時に一度だけ join する
         for ch in para:
-            w = 2 if is_fullwidth(ch) else 1
+            o = ord(ch)
+            w = width[o] if o < 0x10000 else wide(o)
             if wsum + w > cols:
-                out.append(line); line=""; wsum=0
+                yield "".join(buf); buf.clear(); wsum=0
                 if ch==" ": continue
-            line += ch; wsum += w
-        out.append(line)
-    return out
+            buf.append(ch); wsum += w
+        yield "".join(buf)
+
+def wrap_text_to_cols(text: str, cols: int) -> List[str]:
+    return list(iter_wrap(text, cols))
+
+# parse_markdown の正規表現を試す価値がある先頭文字。普通の本文行ではここで弾いて
+# 正規表現の起動自体を省く（C実装の文字列比較のみで済む）
+_H2_LEAD = "#＃0123456789０１２３４５６７８９"
+_LI_LEAD = "-*－＊・•"
 
 def parse_markdown(src: str, indent_fullwidth: bool, pagebreak_marker: str, debug_log=None) -> List[Dict]:
     src = src.replace("\r\n","\n").replace("\r","\n")
     lines = src.split("\n"); blocks=[]; i=0
-    H2_RE = re.compile(r"^\s*(?:[#＃]{2}|[0-9０-９]+[\.．)])\s*")   # 1. / １． / ## / ＃＃
-    LI_RE = re.compile(r"^\s*(?:[-*\uFF0D\uFF0A・•])\s*(.*)$")      # - * 全角－＊ ・ •（後続空白は任意）
+    blocks_append = blocks.append                    # 属性参照をループ外で束縛
+    h2_match = H2_RE.match; li_match = LI_RE.match
 
     while i < len(lines):
         line = lines[i]
         if debug_log is not None:
             debug_log.append(f"[LINE {i+1}] {line[:40]}")
 
-        if line.strip() == pagebreak_marker:
-            blocks.append({"type":"pagebreak","text":""})
+        stripped = line.strip()
+        if stripped == pagebreak_marker:
+            blocks_append({"type":"pagebreak","text":""})
             if debug_log is not None: debug_log.append(f"[PARSE] pagebreak at {i+1}")
             i += 1; continue
 
-        if H2_RE.match(line):
+        lead = stripped[:1]
+        if lead and lead in _H2_LEAD and h2_match(line):
             text = H2_RE.sub("", line)
-            blocks.append({"type":"h2","text": text})
+            blocks_append({"type":"h2","text": text})
             if debug_log is not None: debug_log.append(f"[PARSE] H2: '{text[:40]}'")
             i += 1; continue
 
-        m = LI_RE.match(line)
+        m = li_match(line) if lead and lead in _LI_LEAD else None
         if m and m.group(1):
             text = "・" + m.group(1).rstrip()
-            blocks.append({"type":"li","text": text})
+            blocks_append({"type":"li","text": text})
             if debug_log is not None: debug_log.append(f"[PARSE] LI: '{text[:40]}'")
             i += 1; continue
 
@@ -347,19 +652,26 @@ def parse_markdown(src: str, indent_fullwidth: bool, pagebreak_marker: str, debu
         para=[line]; i+=1
         while i<len(lines) and lines[i].strip()!="": para.append(lines[i]); i+=1
         text="\n".join(para).rstrip()
-        blocks.append({"type":"p","text":text})
+        # 連続する空段落は1つに畳む（後段の空ブロック処理を減らす）
+        if text or not (blocks and blocks[-1]["type"]=="p" and not blocks[-1]["text"]):
+            blocks_append({"type":"p","text":text})
         if debug_log is not None and text:
             debug_log.append(f"[PARSE] P: '{text[:40]}'")
-        if i<len(lines) and lines[i].strip()=="": blocks.append({"type":"p","text":""}); i+=1
+        if i<len(lines) and lines[i].strip()=="":
+            if not (blocks and blocks[-1]["type"]=="p" and not blocks[-1]["text"]):
+                blocks_append({"type":"p","text":""})
+            i+=1
     return blocks
 
 
 
 def add_line_text(el: etree.Element, line: str, inline_bold: bool, style_props: Dict[str,str]):
+    SubElement = etree.SubElement   # 属性参照をループ外で束縛（1行ごとに呼ばれる）
     if el.tag.endswith("text"):
         # 行をまとめる tspan（この直後の tail に改行を入れる）
-        line_tspan = etree.SubElement(el, inkex.addNS("tspan","svg"))
-        apply_style(line_tspan, style_props)
+        # style は SubElement の attrib で一括初期化（Python→Cの往復を1回に）
+        line_tspan = SubElement(el, SVG_TSPAN,
+                                attrib={"style": _style_str(style_props)} if style_props else None)
 
         # 空行はスペース1つ（高さ確保）
         if line == "":
@@ -367,30 +679,27 @@ def add_line_text(el: etree.Element, line: str, inline_bold: bool, style_props:
             line_tspan.tail = "\n"
             return
 
-        if inline_bold:
+        if inline_bold and "**" in line:
             # "**…**" を分割。プレーンは line_tspan.text / bold は子tspan
-            buf = ""
+            # （+= の文字列再構築を避け、リストに溜めて最後に一括join）
+            buf_parts: List[str] = []
             for seg, is_bold in split_inline_bold(line):
                 if not seg:
                     continue
                 if is_bold:
                     # まずバッファを吐く
-                    if buf:
-                        if line_tspan.text:
-                            line_tspan.text += buf
-                        else:
-                            line_tspan.text = buf
-                        buf = ""
-                    b = etree.SubElement(line_tspan, inkex.addNS("tspan","svg"))
-                    apply_style(b, {"font-weight":"bold"})
+                    if buf_parts:
+                        prev = line_tspan.text
+                        line_tspan.text = (prev or "") + "".join(buf_parts)
+                        buf_parts.clear()
+                    b = SubElement(line_tspan, SVG_TSPAN)
+                    apply_style_fresh(b, _BOLD_PROPS)
                     b.text = seg
                 else:
-                    buf += seg
-            if buf:
-                if line_tspan.text:
-                    line_tspan.text += buf
-                else:
-                    line_tspan.text = buf
+                    buf_parts.append(seg)
+            if buf_parts:
+                prev = line_tspan.text
+                line_tspan.text = (prev or "") + "".join(buf_parts)
         else:
             line_tspan.text = line
 
@@ -399,20 +708,23 @@ def add_line_text(el: etree.Element, line: str, inline_bold: bool, style_props:
 
     else:
         # flowed text（flowRoot）は従来通り
-        para = etree.SubElement(el, inkex.addNS("flowPara","svg"))
-        apply_style(para, style_props)
+        para = SubElement(el, SVG_FLOWPARA,
+                          attrib={"style": _style_str(style_props)} if style_props else None)
         if line == "":
             para.text = " "
             return
-        if inline_bold:
+        if inline_bold and "**" in line:
+            plain_parts: List[str] = []
             for seg,is_bold in split_inline_bold(line):
                 if not seg: continue
                 if is_bold:
-                    sp = etree.SubElement(para, inkex.addNS("flowSpan","svg"))
-                    apply_style(sp, {"font-weight":"bold"})
+                    sp = SubElement(para, SVG_FLOWSPAN)
+                    apply_style_fresh(sp, _BOLD_PROPS)
                     sp.text = seg
                 else:
-                    para.text = (para.text or "") + seg
+                    plain_parts.append(seg)
+            if plain_parts:
+                para.text = "".join(plain_parts)
         else:
             para.text = line
 
@@ -428,7 +740,7 @@ class MdFill(inkex.EffectExtension):
         # 候補を並べ、先に「内容.md」が見つかった場所を採用
         cand: List[Path] = []
         # 1) export-filename の親（設定していれば元SVGの近くであることが多い）
-        exp = docroot.get(inkex.addNS('export-filename','inkscape'))
+        exp = docroot.get(INK_EXPORT_FILENAME)
         if exp: cand.append(Path(exp).parent)
         # 2) 入力（一時コピー）の親
         svg_parent = Path(getattr(self.options,"input_file", "") or (self.svg_file or "")).parent
@@ -445,16 +757,28 @@ class MdFill(inkex.EffectExtension):
             if p in seen: continue
             seen.add(p); uniq.append(p)
         for c in uniq:
+            # Path.exists() の stat 1回/候補ではなく readdir 1回で名前を突き合わせる
+            # （ネットワークドライブ等で stat が遅い環境向け）
             try:
-                if (c/"内容.md").exists(): return c
-            except Exception:
+                with os.scandir(c) as it:
+                    for e in it:
+                        if e.name == "内容.md" and e.is_file():
+                            return c
+            except OSError:
                 pass
         return uniq[0] if uniq else Path.cwd()
 
     def effect(self):
         doc = self.document.getroot()
         _ensure_pages(doc)
-        
+        # namedviewと物理ページ一覧は文書内で1つ/1組しかないので、ここで一度
+        # 引いて使い回す（get_page呼出しごとのXPath再実行を避ける）。
+        # 追加分は get_page が nv_pages に直接 append して一覧を保守する
+        nv = _namedview(doc)
+        if nv is None: raise inkex.AbortExtension("sodipodi:namedview が見つかりません")
+        nv_pages = _list_pages(nv)
+        if not nv_pages: raise inkex.AbortExtension("inkscape:page が見つかりません")
+
         # 基準フォルダの決定
         b = (self.options.base_dir or "").strip()
         if b:
@@ -474,8 +798,9 @@ class MdFill(inkex.EffectExtension):
         semantic_css, label_css = parse_css(css_path)
         settings = read_settings(settings_path)
 
-        layer_p1 = find_layer_by_label(doc, "p1")
-        layer_p2 = find_layer_by_label(doc, "p2")
+        layers = _index_layers(doc)   # label→レイヤの索引（1回の走査で構築）
+        layer_p1 = layers.get("p1")
+        layer_p2 = layers.get("p2")
         if layer_p1 is None or layer_p2 is None:
             raise inkex.AbortExtension("レイヤ 'p1' および 'p2' が必要です。")
         text_p1 = find_text_by_label(layer_p1, "p1")
@@ -487,7 +812,7 @@ class MdFill(inkex.EffectExtension):
         n = 3
         while True:
             lab = f"p{n}"
-            layer = find_layer_by_label(doc, lab)
+            layer = layers.get(lab)
             if layer is None:
                 break
             t = find_text_by_label(layer, lab)
@@ -504,20 +829,19 @@ class MdFill(inkex.EffectExtension):
 
 
 
-        lp1 = int(settings["lines_per_page"].get("p1",21))
-        lpn = int(settings["lines_per_page"].get("default",30))
-        cp1 = int(settings["cols_per_line"].get("p1",86))
-        cpn = int(settings["cols_per_line"].get("default",48))
+        # ページ毎の行数/桁数は settings から一度だけ解決してリストに展開する。
+        # limits は行毎に呼ばれるため、毎回の入れ子get＋int変換を索引1回に置き換える
+        # （必要ページ数は見積り前に確定しないので、未到達ページ分は追って伸ばす）
+        lp_map = settings["lines_per_page"]; cp_map = settings["cols_per_line"]
+        lp_def = int(lp_map.get("default", 30)); cp_def = int(cp_map.get("default", 48))
+        lp_tbl: List[int] = []; cp_tbl: List[int] = []
         def limits(idx: int) -> Tuple[int, int]:
-            page_lab = f"p{idx+1}"
-            lp = settings["lines_per_page"].get(page_lab,
-                settings["lines_per_page"].get("default", 30))
-            cp = settings["cols_per_line"].get(page_lab,
-                settings["cols_per_line"].get("default", 48))
-            return int(lp), int(cp)
-
-        def style_for(kind:str)->Dict[str,str]:
-            return {"h2":"h2","li":"li"}.get(kind, "p")
+            while len(lp_tbl) <= idx:
+                page_lab = f"p{len(lp_tbl)+1}"
+                lp_tbl.append(int(lp_map.get(page_lab, lp_def)))
+                cp_tbl.append(int(cp_map.get(page_lab, cp_def)))
+            return lp_tbl[idx], cp_tbl[idx]
+
         def style_props(kind: str) -> Dict[str, str]:
             sel = {"h2":"h2","li":"li"}.get(kind, "p")
             props = dict(semantic_css.get(sel, {}))
@@ -530,6 +854,12 @@ class MdFill(inkex.EffectExtension):
                 props.setdefault("font-family", "BIZ UDGothic")
                 props.setdefault("font-weight", "bold")
             return props
+        # 種別は3+1通りしかないので、行毎に組み立てず先に確定させておく
+        style_tbl = {k: style_props(k) for k in ("h2", "li", "p", "pagebreak")}
+
+        # 使用中idは開始時に一度だけ収集し、clone間で増分更新して使い回す
+        # （cloneのたびに全木走査すると O(ページ数×要素数) になる）
+        id_cache = _collect_ids(doc)
 
         def get_page(idx:int)->etree.Element:
             nonlocal pages, doc, layer_p2, logs
@@ -537,7 +867,12 @@ class MdFill(inkex.EffectExtension):
 
             # 既存 p{idx+1} レイヤがあればそれを返す（先に事前生成分を拾う）
             pre_lab = f"p{idx+1}"
-            pre_layer = find_layer_by_label(doc, pre_lab)
+            pre_layer = layers.get(pre_lab)
+            if pre_layer is None:
+                # 索引構築後に ensure_pages_horizontal_from_p3 が作ったレイヤを拾う
+                pre_layer = find_layer_by_label(doc, pre_lab)
+                if pre_layer is not None:
+                    layers[pre_lab] = pre_layer
             if pre_layer is not None:
                 pre_text = find_text_by_label(pre_layer, pre_lab)
                 if pre_text is not None:
@@ -546,12 +881,10 @@ class MdFill(inkex.EffectExtension):
                     return pre_text
 
             # 先に物理ページを確保（既存レイヤがあっても必ず実行）
-            nv = _namedview(doc)
-            if nv is None: raise inkex.AbortExtension("sodipodi:namedview が見つかりません")
-            pgs = _list_pages(nv)
-            if not pgs:   raise inkex.AbortExtension("inkscape:page が見つかりません")
-            while len(pgs) <= idx:
-                pgs.append(_append_page_like(nv, pgs[-1], gap_units=10.0))
+            pgs = nv_pages   # effect開始時に取得済みの一覧を使い回す
+            if len(pgs) <= idx:
+                pgs.extend(_append_pages_like(nv, pgs[-1], idx + 1 - len(pgs),
+                                              gap_units=10.0, existing=len(pgs)))
             logs.append(f"[DBG] phys_pages={len(pgs)} after_ensure")
 
             # 既存 p{idx+1} レイヤがあればそれを返す
@@ -560,7 +893,8 @@ class MdFill(inkex.EffectExtension):
 
             # なければ p2 を雛形に複製
             new_lab = f"p{idx+1}"
-            new_layer = clone_layer_as(doc, layer_p2, new_lab, "p2", new_lab)
+            new_layer = clone_layer_as(doc, layer_p2, new_lab, "p2", new_lab, ids=id_cache)
+            layers[new_lab] = new_layer
             new_text  = find_text_by_label(new_layer, new_lab)
             if new_text is None:
                 raise inkex.AbortExtension(f"複製レイヤ {new_lab} にテキストが見つかりません")
@@ -583,6 +917,16 @@ class MdFill(inkex.EffectExtension):
             pagebreak_marker=self.options.force_newpage_marker,
             debug_log=logs,                              # ← 解析ログを記録
         )
+        # 折返し結果はページ数見積りと本流し込みの2回使うため、ブロック×桁数で
+        # キャッシュして折返し計算自体は1回に抑える（折返しが最重量のため効果大）
+        wrap_cache: Dict[Tuple[int, int], List[str]] = {}
+        def _wrap_cached(blk, cols: int) -> List[str]:
+            key = (id(blk), cols)
+            lines = wrap_cache.get(key)
+            if lines is None:
+                lines = wrap_cache[key] = list(iter_wrap(blk["text"], cols))
+            return lines
+
         def _estimate_required_pages(blocks, limits_func) -> int:
             page_idx, used = 0, 0
             for blk in blocks:
@@ -592,8 +936,7 @@ class MdFill(inkex.EffectExtension):
                     continue
                 # このブロックが生成する行
                 _, cols = limits_func(page_idx)
-                lines = wrap_text_to_cols(blk["text"], cols) or [""]
-                for _ in lines:
+                for _ in _wrap_cached(blk, cols):
                     m, _ = limits_func(page_idx)
                     if used >= m:
                         page_idx += 1
@@ -602,9 +945,11 @@ class MdFill(inkex.EffectExtension):
             return page_idx + 1  # 0始まり → 枚数
 
         required_pages = _estimate_required_pages(blocks, limits)
-        ensure_pages_horizontal_from_p3(self, total_pages=required_pages, step_px=220.0, logs=logs)
+        ensure_pages_horizontal_from_p3(self, total_pages=required_pages, step_px=220.0, logs=logs,
+                                        layers=layers)
 
-        page_idx=0; used=0
+        indent = bool(self.options.indent_fullwidth)
+        page_idx=0; used=0; nlines=0
         for blk in blocks:
             if blk["type"]=="pagebreak":
                 page_idx += 1; used = 0
@@ -612,35 +957,38 @@ class MdFill(inkex.EffectExtension):
                 logs.append(f"[PAGE] pagebreak -> p{page_idx+1}")
                 continue
             cols = limits(page_idx)[1]
-            lines = wrap_text_to_cols(blk["text"], cols) or [""]
-
-            if blk["type"] == "h2":
-                lines = [ln.lstrip(FULLWIDTH_SPACE + " ") for ln in lines]
-            elif bool(self.options.indent_fullwidth):
-                lines = [(FULLWIDTH_SPACE + ln) if ln and not ln.startswith(FULLWIDTH_SPACE) else ln
-                        for ln in lines]
-
-            i=0
-            while i < len(lines):
+            is_h2 = blk["type"] == "h2"
+            # ブロック内の全行で同一なのでループ外で確定（未知種別は p 扱い）
+            props = style_tbl.get(blk["type"], style_tbl["p"])
+
+            # 見積り時にキャッシュ済みの折返し行をそのまま流す（再折返しなし）
+            nlines = 0
+            for line in _wrap_cached(blk, cols):
+                if is_h2:
+                    line = line.lstrip(FULLWIDTH_SPACE + " ")
+                elif indent and line and not line.startswith(FULLWIDTH_SPACE):
+                    line = FULLWIDTH_SPACE + line
                 m,_ = limits(page_idx)
                 if used >= m:
                     page_idx += 1; used = 0
                     _ = get_page(page_idx)
                     logs.append(f"[PAGE] overflow -> p{page_idx+1}")
                 el = get_page(page_idx)
-                # 置換：add_line_text 呼び出し
-                add_line_text(el, lines[i], inline_bold=True, style_props=style_props(blk["type"]))
-                used += 1; i += 1
+                add_line_text(el, line, inline_bold=True, style_props=props)
+                used += 1; nlines += 1
 
         try:
             log_path.write_text("\n".join(logs), encoding="utf-8")
-            logs.append(f"[BLK] {blk['type']} lines={len(lines)} pidx={page_idx}")
+            logs.append(f"[BLK] {blk['type']} lines={nlines} pidx={page_idx}")
         except Exception as e:
             inkex.utils.debug(f"ログ書出し失敗: {e}")
 
-        h2c = sum(1 for l in logs if "[PARSE] H2:" in l)
-        lic = sum(1 for l in logs if "[PARSE] LI:" in l)
-        pgc = sum(1 for l in logs if "phys_pages=" in l)
+        # 集計はログ1回の走査で3カウンタを更新（3回なめない）
+        h2c = lic = pgc = 0
+        for l in logs:
+            if "[PARSE] H2:" in l: h2c += 1
+            elif "[PARSE] LI:" in l: lic += 1
+            elif "phys_pages=" in l: pgc += 1
         logs.append(f"[SUMMARY] H2={h2c} LI={lic} phys_pages_seen={pgc}")
 
 
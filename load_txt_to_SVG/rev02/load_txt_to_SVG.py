@@ -6,24 +6,41 @@ import sys
 from pathlib import Path
 import inkex
 from inkex import TextElement, Tspan, NSS
+from lxml import etree
 import re
 
+# 正規表現はモジュール読込時に一括コンパイル（呼出し毎の re.* キャッシュ検索を回避）
+_LINE_HEIGHT_RE = re.compile(r"line-height\s*:\s*([0-9.]+)")
+_BACKSLASH_EOL_RE = re.compile(r"(?m)\\\s*$")
+_H2_SPLIT_RE = re.compile(r"\s*##\s*")
+_LI_SPLIT_RE = re.compile(r"\s+([\-＊*・])\s+")
+_NUM_SPLIT_RE = re.compile(r"\s+([0-9０-９]+[\.．])\s+")
+
+# 属性名は定数化しておく（行ごとの文字列整形を回避）
+XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+SODO_ROLE = "{%s}role" % NSS["sodipodi"]
+
+# XPathはコンパイル済みオブジェクトを使い回す（呼出し毎の式パースを回避）。
+# ラベルは $lab の変数束縛で渡すので、式への文字列埋め込みも不要になる
+_LAYER_BY_LABEL = etree.XPath(
+    ".//svg:g[@inkscape:groupmode='layer'][@inkscape:label=$lab]", namespaces=NSS)
+_TEXT_BY_LABEL = etree.XPath(
+    ".//*[@inkscape:label=$lab and self::svg:text]", namespaces=NSS)
+
 def _find_layer_by_label(root, label: str):
     """指定labelのレイヤ(<g>)を返す"""
-    xp = f".//svg:g[@inkscape:groupmode='layer'][@inkscape:label='{label}']"
-    res = root.xpath(xp, namespaces=NSS)
+    res = _LAYER_BY_LABEL(root, lab=label)
     return res[0] if res else None
 
 def _find_text_by_label(scope, label: str):
     """scope直下で指定labelの<text>を返す"""
-    xp = f".//*[@inkscape:label='{label}' and self::svg:text]"
-    res = scope.xpath(xp, namespaces=NSS)
+    res = _TEXT_BY_LABEL(scope, lab=label)
     return res[0] if res else None
 
 
 
 def _line_height_em(style: str, default=1.4) -> float:
-    m = re.search(r"line-height\s*:\s*([0-9.]+)", style or "")
+    m = _LINE_HEIGHT_RE.search(style or "")
     try: return float(m.group(1)) if m else default
     except: return default
 
@@ -33,7 +50,7 @@ def _ensure_text_lines(text_elem: TextElement, lines):
         text_elem.remove(c)
     text_elem.text = None
     # 改行をそのまま表示させる
-    text_elem.set("{http://www.w3.org/XML/1998/namespace}space", "preserve")
+    text_elem.set(XML_SPACE, "preserve")
     style = text_elem.get("style","")
     if "white-space:" not in style:
         text_elem.set("style", (style + ";white-space:pre").strip(";"))
@@ -46,7 +63,7 @@ def _ensure_text_lines(text_elem: TextElement, lines):
     first = True
     for line in lines:
         t = Tspan()
-        t.set("{%s}role" % NSS["sodipodi"], "line")
+        t.set(SODO_ROLE, "line")
         t.set("x", x0)
         if first:
             t.set("y", y0)
@@ -75,14 +92,14 @@ class MdFill(inkex.EffectExtension):
         # 改行トークンを実改行へ
         md_text = md_text.replace("<br>", "\n")
         md_text = md_text.replace("\\\\", "\n")                   # 「\\」→改行
-        md_text = re.sub(r"(?m)\\\s*$", "\n", md_text)            # 行末の単独「\」→改行
+        md_text = _BACKSLASH_EOL_RE.sub("\n", md_text)            # 行末の単独「\」→改行
         # 2) Markdown風の区切りを改行に
         #   見出し "## " の手前で改行
-        md_text = re.sub(r"\s*##\s*", "\n", md_text)
+        md_text = _H2_SPLIT_RE.sub("\n", md_text)
         #   箇条書き " - " / " * " の手前で改行
-        md_text = re.sub(r"\s+([\-＊*・])\s+", r"\n\1 ", md_text)
+        md_text = _LI_SPLIT_RE.sub(r"\n\1 ", md_text)
         #   番号付き "1. " などの手前で改行
-        md_text = re.sub(r"\s+([0-9０-９]+[\.．])\s+", r"\n\1 ", md_text)
+        md_text = _NUM_SPLIT_RE.sub(r"\n\1 ", md_text)
         #   ページ区切りはそのまま文字として残す（今はp1/t1のみ対応）
         # 正規化
         lines = md_text.replace("\r\n","\n").replace("\r","\n").split("\n")